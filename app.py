@@ -1,75 +1,92 @@
+import io
 import os
 import re
 import openpyxl
 from datetime import datetime
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for
-from werkzeug.utils import secure_filename
-import tempfile
-import shutil
+from flask import Flask, Request, render_template, request, send_file, flash, redirect, url_for
+from job_profiler import profiled, input_shape, result_shape
+
+
+class InMemoryRequest(Request):
+    """Запрос, который держит загруженные файлы в памяти, а не во временных файлах на диске"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Размер запроса ограничен MAX_CONTENT_LENGTH, поэтому буфер в памяти безопасен
+        return io.BytesIO()
+
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.secret_key = 'your-secret-key-here'  # В продакшене используйте безопасный ключ
 
 # Настройки загрузки файлов
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 
-# Создаем папку для загрузок если её нет
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Максимум 16MB
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_excel_file(filepath):
-    """Обрабатывает Excel файл и возвращает найденные номера"""
+@profiled('app.process_excel_file',
+          lambda result, file: input_shape(file, len(result) if result is not None else None))
+def process_excel_file(file):
+    """Обрабатывает Excel файл (путь или файловый объект) и возвращает найденные номера"""
     all_found_numbers = set()
     # Ищем номера с любым 3-значным кодом после +7
     phone_regex = re.compile(r'(?:[+7\s-]?\(?|8\s-?)?(\d{3})\)?[-\s]?(\d{3})[-\s]?(\d{2})[-\s]?(\d{2})')
     
     try:
-        workbook = openpyxl.load_workbook(filepath, data_only=True)
-        for sheet in workbook.sheetnames:
-            for row in workbook[sheet].iter_rows():
-                for cell in row:
-                    if cell.value:
-                        matches = phone_regex.finditer(str(cell.value))
-                        for match in matches:
-                            # Проверяем, что код начинается с 7 (для +7)
-                            code = match.group(1)
-                            if code.startswith('7'):
-                                normalized = f"7{code}{match.group(2)}{match.group(3)}{match.group(4)}"
-                                all_found_numbers.add(normalized)
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.sheetnames:
+                for row in workbook[sheet].iter_rows(values_only=True):
+                    for value in row:
+                        if value:
+                            matches = phone_regex.finditer(str(value))
+                            for match in matches:
+                                # Проверяем, что код начинается с 7 (для +7)
+                                code = match.group(1)
+                                if code.startswith('7'):
+                                    normalized = f"7{code}{match.group(2)}{match.group(3)}{match.group(4)}"
+                                    all_found_numbers.add(normalized)
+        finally:
+            workbook.close()
         return sorted(list(all_found_numbers))
     except Exception as e:
         raise Exception(f"Ошибка чтения файла: {e}")
 
+def discard_sheet_tempfile(sheet):
+    """Удаляет временный файл write-only листа, если save() до него не дошел"""
+    writer = getattr(sheet, '_writer', None)
+    if writer is not None and os.path.exists(writer.out):
+        writer.close()
+        writer.cleanup()
+
+@profiled('app.create_result_file', lambda result, numbers: result_shape(len(numbers)))
 def create_result_file(numbers):
-    """Создает Excel файл с результатами"""
+    """Создает Excel файл с результатами в буфере, возвращает буфер и имя файла"""
     timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     output_filename = f"found_numbers_+7_{timestamp}.xlsx"
     
-    # Создаем временный файл
-    temp_dir = tempfile.mkdtemp()
-    output_filepath = os.path.join(temp_dir, output_filename)
-    
+    # openpyxl пишет строки листа во временный файл (/tmp/openpyxl.*) и удаляет его в save();
+    # при ошибке до save() удаляем его сами, чтобы он не копился до завершения процесса
+    sheet = None
     try:
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Найденные номера"
-        sheet['A1'] = "Найденные номера (+7xxxxxxxxx)"
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet("Найденные номера")
+        sheet.append(["Найденные номера (+7xxxxxxxxx)"])
         
-        for index, number in enumerate(numbers, start=2):
-            sheet[f'A{index}'] = number
+        for number in numbers:
+            sheet.append([number])
         
-        workbook.save(output_filepath)
-        return output_filepath, output_filename
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        return output, output_filename
     except Exception as e:
-        shutil.rmtree(temp_dir)
+        if sheet is not None:
+            discard_sheet_tempfile(sheet)
         raise Exception(f"Ошибка создания файла результатов: {e}")
 
 @app.route('/', methods=['GET', 'POST'])
@@ -89,31 +106,20 @@ def upload_file():
         
         # Проверяем расширение файла
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            
             try:
-                # Сохраняем загруженный файл
-                file.save(filepath)
-                
-                # Обрабатываем файл
-                numbers = process_excel_file(filepath)
+                # Обрабатываем файл прямо из буфера запроса, не сохраняя его на диск
+                numbers = process_excel_file(file.stream)
                 
                 if not numbers:
                     flash('В файле не найдено номеров с кодом +7')
-                    # Удаляем загруженный файл
-                    os.remove(filepath)
                     return redirect(request.url)
                 
                 # Создаем файл результатов
-                result_filepath, result_filename = create_result_file(numbers)
-                
-                # Удаляем загруженный файл
-                os.remove(filepath)
+                result_buffer, result_filename = create_result_file(numbers)
                 
                 # Возвращаем файл для скачивания
                 return send_file(
-                    result_filepath,
+                    result_buffer,
                     as_attachment=True,
                     download_name=result_filename,
                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -121,9 +127,6 @@ def upload_file():
                 
             except Exception as e:
                 flash(f'Ошибка обработки файла: {str(e)}')
-                # Удаляем загруженный файл в случае ошибки
-                if os.path.exists(filepath):
-                    os.remove(filepath)
                 return redirect(request.url)
         else:
             flash('Разрешены только файлы Excel (.xlsx, .xls)')
@@ -0,0 +1,188 @@
+import os
+import re
+import json
+import time
+import random
+import shutil
+import cProfile
+import logging
+import threading
+import functools
+import tracemalloc
+import openpyxl
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Профилирование включается только переменными окружения при запуске процесса.
+# Если PROFILE_JOBS не задан, декоратор profiled возвращает функцию без изменений.
+PROFILE_ENABLED = os.getenv('PROFILE_JOBS', '0').lower() in ('1', 'true', 'yes', 'on')
+PROFILE_SAMPLE_RATE = 1.0  # доля профилируемых задач, 0..1
+PROFILE_THRESHOLD_MS = 1000.0  # сохраняем только медленные задачи
+PROFILE_DIR = 'profiles'
+PROFILE_MAX_CAPTURES = 20  # старые снимки удаляются
+
+
+def _env_number(name, default, cast):
+    """Читает числовую переменную окружения; при ошибке пишет предупреждение и берет значение по умолчанию"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning(f"Некорректное значение {name}={value!r}, использую {default}")
+        return default
+
+
+# Остальные настройки разбираем только при включенном профилировании,
+# чтобы опечатка в них не мешала запуску бота и скриптов
+if PROFILE_ENABLED:
+    PROFILE_SAMPLE_RATE = _env_number('PROFILE_SAMPLE_RATE', PROFILE_SAMPLE_RATE, float)
+    PROFILE_THRESHOLD_MS = _env_number('PROFILE_THRESHOLD_MS', PROFILE_THRESHOLD_MS, float)
+    PROFILE_DIR = os.getenv('PROFILE_DIR', PROFILE_DIR)
+    PROFILE_MAX_CAPTURES = max(1, _env_number('PROFILE_MAX_CAPTURES', PROFILE_MAX_CAPTURES, int))
+
+# Имя папки снимка: <дата>_<время>_<микросекунды>_<задача>_<N>ms; чужие папки в PROFILE_DIR не трогаем
+CAPTURE_NAME_REGEX = re.compile(r'^\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}_\d{6}_.+_\d+ms$')
+
+# tracemalloc глобален для процесса, поэтому считаем, сколько задач его используют,
+# и останавливаем его только если запускали сами (а не PYTHONTRACEMALLOC или разработчик)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+
+def workbook_shape(source):
+    """Возвращает форму Excel файла: количество листов, строк и непустых ячеек"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = cells = 0
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows(values_only=True):
+                rows += 1
+                cells += sum(1 for value in row if value is not None)
+        return {'sheets': len(workbook.sheetnames), 'rows': rows, 'cells': cells}
+    finally:
+        workbook.close()
+
+
+def input_shape(source, matches=None):
+    """Форма входного файла и число найденных номеров для meta.json"""
+    return {**workbook_shape(source), 'matches': matches}
+
+
+def result_shape(count):
+    """Форма файла результатов: один лист, заголовок и count строк с номерами"""
+    return {'sheets': 1, 'rows': count + 1, 'cells': count + 1, 'matches': count}
+
+
+def _rotate_captures():
+    captures = sorted(
+        name for name in os.listdir(PROFILE_DIR)
+        if CAPTURE_NAME_REGEX.match(name) and os.path.isdir(os.path.join(PROFILE_DIR, name))
+    )
+    for name in captures[:-PROFILE_MAX_CAPTURES]:
+        shutil.rmtree(os.path.join(PROFILE_DIR, name), ignore_errors=True)
+
+
+def _save_capture(job, elapsed_ms, profiler, snapshot, meta):
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S_%f')
+    capture_dir = os.path.join(PROFILE_DIR, f"{timestamp}_{job}_{elapsed_ms:.0f}ms")
+    os.makedirs(capture_dir)
+
+    profiler.dump_stats(os.path.join(capture_dir, 'profile.pstats'))
+    snapshot.dump(os.path.join(capture_dir, 'tracemalloc.snapshot'))
+    with open(os.path.join(capture_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    _rotate_captures()
+    logger.warning(f"Медленная задача {job}: {elapsed_ms:.0f} мс, профиль сохранен в {capture_dir}")
+
+
+def profiled(job, describe=None):
+    """Декоратор: снимает cProfile и tracemalloc для задач медленнее PROFILE_THRESHOLD_MS.
+
+    describe(result, *args, **kwargs) возвращает словарь с формой входных данных
+    (листы, строки, ячейки, совпадения); вызывается только для сохраняемых снимков.
+    """
+    def decorator(func):
+        if not PROFILE_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if random.random() >= PROFILE_SAMPLE_RATE:
+                return func(*args, **kwargs)
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # В этом потоке уже работает другой профилировщик
+                return func(*args, **kwargs)
+
+            _start_tracemalloc()
+            # Пик памяти общий для процесса: при параллельных задачах он включает и их выделения
+            tracemalloc.reset_peak()
+            started = time.perf_counter()
+            result = None
+            error = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                profiler.disable()
+                # Время измерено под cProfile и tracemalloc, поэтому заметно больше обычного
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                snapshot = None
+                try:
+                    peak_bytes = tracemalloc.get_traced_memory()[1]
+                    if elapsed_ms >= PROFILE_THRESHOLD_MS:
+                        snapshot = tracemalloc.take_snapshot()
+                finally:
+                    _stop_tracemalloc()
+
+                if snapshot is not None:
+                    meta = {
+                        'job': job,
+                        'elapsed_ms': round(elapsed_ms, 1),
+                        'traced_peak_bytes': peak_bytes,
+                        'error': str(error) if error else None,
+                    }
+                    if describe:
+                        # Упавшая задача часто упадет и здесь (битый файл), но снимок все равно нужен
+                        try:
+                            meta.update(describe(result, *args, **kwargs))
+                        except Exception as e:
+                            meta['shape_error'] = str(e)
+                    try:
+                        _save_capture(job, elapsed_ms, profiler, snapshot, meta)
+                    except Exception as e:
+                        logger.error(f"Не удалось сохранить профиль задачи {job}: {e}")
+
+        return wrapper
+    return decorator
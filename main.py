@@ -1,12 +1,26 @@
 import os
 import re
+import sys
+import json
+import time
+import heapq
 import openpyxl
 from datetime import datetime
+from job_profiler import profiled, input_shape, result_shape
 
 INPUT_DIR = 'in'
 OUTPUT_DIR = 'out'
 BASE_OUTPUT_NAME = 'found_numbers_978'
 
+# Настройки режима наблюдения за папкой (--watch)
+ROLLING_OUTPUT_NAME = f"{BASE_OUTPUT_NAME}.xlsx"
+ROLLING_TMP_NAME = f".{ROLLING_OUTPUT_NAME}.tmp"
+WATCH_STATE_NAME = '.watch_state.json'
+WATCH_POLL_INTERVAL = 2  # секунды между проверками папки
+WATCH_SETTLE_TIME = 3  # сколько секунд файл не должен меняться перед обработкой
+
+PHONE_REGEX = re.compile(r'(?:[+7\s-]?\(?|8\s-?)?(978)\)?[-\s]?(\d{3})[-\s]?(\d{2})[-\s]?(\d{2})')
+
 
 def setup_directories():
     if not os.path.isdir(INPUT_DIR):
@@ -18,11 +32,27 @@ def setup_directories():
         os.makedirs(OUTPUT_DIR)
 
 
+@profiled('main.extract_numbers',
+          lambda result, filepath: input_shape(filepath, len(result) if result is not None else None))
+def extract_numbers(filepath):
+    """Возвращает множество номеров 7978xxxxxxx, найденных в xlsx файле"""
+    numbers = set()
+    workbook = openpyxl.load_workbook(filepath, data_only=True)
+    for sheet in workbook.sheetnames:
+        for row in workbook[sheet].iter_rows():
+            for cell in row:
+                if cell.value:
+                    matches = PHONE_REGEX.finditer(str(cell.value))
+                    for match in matches:
+                        normalized = f"7{match.group(1)}{match.group(2)}{match.group(3)}{match.group(4)}"
+                        numbers.add(normalized)
+    return numbers
+
+
 def run_processor():
     setup_directories()
 
     all_found_numbers = set()
-    phone_regex = re.compile(r'(?:[+7\s-]?\(?|8\s-?)?(978)\)?[-\s]?(\d{3})[-\s]?(\d{2})[-\s]?(\d{2})')
 
     files_to_process = [f for f in os.listdir(INPUT_DIR) if f.endswith('.xlsx')]
 
@@ -36,17 +66,8 @@ def run_processor():
         filepath = os.path.join(INPUT_DIR, filename)
         print(f"\n--- Анализирую файл: {filename} ---")
 
-        numbers_in_this_file = set()
         try:
-            workbook = openpyxl.load_workbook(filepath, data_only=True)
-            for sheet in workbook.sheetnames:
-                for row in workbook[sheet].iter_rows():
-                    for cell in row:
-                        if cell.value:
-                            matches = phone_regex.finditer(str(cell.value))
-                            for match in matches:
-                                normalized = f"7{match.group(1)}{match.group(2)}{match.group(3)}{match.group(4)}"
-                                numbers_in_this_file.add(normalized)
+            numbers_in_this_file = extract_numbers(filepath)
         except Exception as e:
             print(f"Ошибка чтения файла {filename}: {e}")
             continue
@@ -77,6 +98,7 @@ def run_processor():
         print("\nОбработка завершена. Номеров с кодом 978 не найдено ни в одном файле.")
 
 
+@profiled('main.save_results', lambda result, numbers: result_shape(len(numbers)))
 def save_results(numbers):
     timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
     output_filename = f"{BASE_OUTPUT_NAME}_{timestamp}.xlsx"
@@ -100,5 +122,196 @@ def save_results(numbers):
         print(f"\nНе удалось сохранить файл результатов. Ошибка: {e}")
 
 
+def file_signature(path):
+    """Возвращает [размер, mtime_ns] файла или None, если его нет"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_watch_state():
+    """Читает список уже обработанных файлов: имя -> [размер, mtime_ns]"""
+    state_path = os.path.join(OUTPUT_DIR, WATCH_STATE_NAME)
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"Не удалось прочитать состояние '{state_path}', начинаю заново. Ошибка: {e}")
+        return {}
+
+    output_filepath = os.path.join(OUTPUT_DIR, ROLLING_OUTPUT_NAME)
+    tmp_path = os.path.join(OUTPUT_DIR, ROLLING_TMP_NAME)
+    if state.get('output') != file_signature(output_filepath):
+        # Состояние пишется до подмены файла результатов. Если процесс упал между этими шагами,
+        # готовый временный файл совпадает с состоянием, и подмену можно просто завершить
+        if state.get('output') is not None and state.get('output') == file_signature(tmp_path):
+            os.replace(tmp_path, output_filepath)
+        else:
+            # Файл результатов удалили или подменили, номера из обработанных файлов потеряны,
+            # поэтому забываем состояние и обрабатываем все файлы заново
+            print(f"Файл результатов '{ROLLING_OUTPUT_NAME}' изменен или удален, обрабатываю все файлы заново.")
+            return {}
+    return state.get('files', {})
+
+
+def save_watch_state(processed, output_signature=None):
+    # Пишем во временный файл и атомарно подменяем, чтобы сбой не оставил битое состояние
+    state_path = os.path.join(OUTPUT_DIR, WATCH_STATE_NAME)
+    tmp_path = state_path + '.tmp'
+    if output_signature is None:
+        output_signature = file_signature(os.path.join(OUTPUT_DIR, ROLLING_OUTPUT_NAME))
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'files': processed, 'output': output_signature}, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def load_rolling_numbers():
+    """Читает накопленный отсортированный список номеров из общего файла результатов"""
+    output_filepath = os.path.join(OUTPUT_DIR, ROLLING_OUTPUT_NAME)
+    if not os.path.exists(output_filepath):
+        return []
+    workbook = openpyxl.load_workbook(output_filepath, read_only=True)
+    sheet = workbook.active
+    numbers = [str(row[0]) for row in sheet.iter_rows(min_row=2, values_only=True) if row and row[0]]
+    workbook.close()
+    # Файл пишет сам демон, поэтому он уже отсортирован; sort здесь почти бесплатен
+    numbers.sort()
+    return numbers
+
+
+def merge_numbers(sorted_numbers, known_numbers, new_numbers):
+    """Добавляет новые номера в отсортированный список и множество известных, возвращает число добавленных"""
+    added = sorted(number for number in new_numbers if number not in known_numbers)
+    if added:
+        # Сортируются только новые номера, с накопленным списком они сливаются одним проходом
+        sorted_numbers[:] = heapq.merge(sorted_numbers, added)
+        known_numbers.update(added)
+    return len(added)
+
+
+@profiled('main.save_rolling_results', lambda result, numbers, processed: result_shape(len(numbers)))
+def save_rolling_results(numbers, processed):
+    """Сохраняет общий файл результатов вместе с состоянием наблюдения"""
+    output_filepath = os.path.join(OUTPUT_DIR, ROLLING_OUTPUT_NAME)
+    tmp_path = os.path.join(OUTPUT_DIR, ROLLING_TMP_NAME)
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Найденные номера")
+    sheet.append(["Найденные номера (7978xxxxxxx)"])
+    for number in numbers:
+        sheet.append([number])
+    workbook.save(tmp_path)
+
+    # Сначала состояние с сигнатурой нового файла, потом подмена: os.replace сохраняет размер и mtime,
+    # а load_watch_state при сбое между шагами доводит подмену до конца
+    save_watch_state(processed, file_signature(tmp_path))
+    os.replace(tmp_path, output_filepath)
+
+
+def watch_folder():
+    """Следит за папкой INPUT_DIR и дописывает новые номера в общий файл результатов"""
+    setup_directories()
+
+    processed = load_watch_state()
+    try:
+        numbers = load_rolling_numbers()
+    except Exception as e:
+        print(f"Не удалось прочитать файл результатов '{ROLLING_OUTPUT_NAME}'. Ошибка: {e}")
+        return
+    known = set(numbers)
+    # Файлы, которые еще могут дописываться: имя -> (сигнатура, время последнего изменения сигнатуры)
+    pending = {}
+    # Есть ли изменения, еще не записанные на диск (повторяем запись на следующей проверке)
+    output_dirty = False
+    state_dirty = False
+
+    print(f"Слежу за папкой '{INPUT_DIR}' (проверка каждые {WATCH_POLL_INTERVAL} сек.). "
+          f"Уже обработано файлов: {len(processed)}, номеров в базе: {len(numbers)}.")
+    print("Для остановки нажмите Ctrl+C.")
+
+    try:
+        while True:
+            present = set()
+            settled = []
+            now = time.monotonic()
+            try:
+                with os.scandir(INPUT_DIR) as entries:
+                    for entry in entries:
+                        # Пропускаем временные файлы блокировки Excel (~$имя.xlsx)
+                        if not entry.name.endswith('.xlsx') or entry.name.startswith('~$'):
+                            continue
+                        try:
+                            if not entry.is_file():
+                                continue
+                            stat = entry.stat()
+                        except OSError:
+                            # Файл удалили или переместили во время проверки
+                            continue
+                        present.add(entry.name)
+                        signature = [stat.st_size, stat.st_mtime_ns]
+                        if processed.get(entry.name) == signature:
+                            pending.pop(entry.name, None)
+                            continue
+
+                        previous = pending.get(entry.name)
+                        if previous is None or previous[0] != signature:
+                            pending[entry.name] = (signature, now)
+                        elif now - previous[1] >= WATCH_SETTLE_TIME:
+                            del pending[entry.name]
+                            settled.append((entry.name, entry.path, signature))
+            except OSError as e:
+                print(f"Не удалось прочитать папку '{INPUT_DIR}'. Ошибка: {e}")
+                time.sleep(WATCH_POLL_INTERVAL)
+                continue
+
+            # Все файлы, успевшие «успокоиться» за эту проверку, сливаются в одну запись результатов
+            for name, path, signature in settled:
+                print(f"\n--- Анализирую файл: {name} ---")
+                try:
+                    found = extract_numbers(path)
+                except Exception as e:
+                    # Запоминаем сигнатуру, чтобы не повторять ошибку, пока файл не изменится
+                    print(f"Ошибка чтения файла {name}: {e}")
+                else:
+                    added = merge_numbers(numbers, known, found)
+                    print(f"Найдено {len(found)} уникальных номеров, новых: {added}.")
+                    output_dirty = output_dirty or added > 0
+                processed[name] = signature
+                state_dirty = True
+
+            # Удаленные из папки файлы забываем, чтобы повторно положенный файл снова обработался
+            for name in [name for name in processed if name not in present]:
+                del processed[name]
+                state_dirty = True
+            for name in [name for name in pending if name not in present]:
+                del pending[name]
+
+            if output_dirty:
+                try:
+                    save_rolling_results(numbers, processed)
+                    output_dirty = state_dirty = False
+                    print(f"Всего номеров: {len(numbers)}. "
+                          f"Файл: {os.path.abspath(os.path.join(OUTPUT_DIR, ROLLING_OUTPUT_NAME))}")
+                except Exception as e:
+                    # Состояние на диске не изменилось, запись повторится на следующей проверке
+                    print(f"Не удалось сохранить файл результатов. Ошибка: {e}")
+            elif state_dirty:
+                try:
+                    save_watch_state(processed)
+                    state_dirty = False
+                except OSError as e:
+                    print(f"Не удалось сохранить состояние наблюдения. Ошибка: {e}")
+
+            time.sleep(WATCH_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("\nНаблюдение остановлено.")
+
+
 if __name__ == "__main__":
-    run_processor()
\ No newline at end of file
+    if '--watch' in sys.argv[1:]:
+        watch_folder()
+    else:
+        run_processor()
\ No newline at end of file
@@ -7,6 +7,7 @@ from telegram import Update, BotCommand
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 import logging
 from collections import defaultdict
+from job_profiler import profiled, input_shape, result_shape
 
 # Настройка логирования
 logging.basicConfig(
@@ -42,6 +43,8 @@ class RussianPhoneProcessor:
             r'(\d{2})'               # 2 цифры
         )
         
+    @profiled('bot.process_excel_file',
+              lambda result, self, file_path: input_shape(file_path, result['total'] if result else None))
     def process_excel_file(self, file_path: str) -> dict:
         """Обрабатывает Excel файл и возвращает найденные номера"""
         numbers_found = set()
@@ -86,6 +89,8 @@ class RussianPhoneProcessor:
         code = number[1:4]
         return code.isdigit() and '200' <= code <= '999'  # Общий диапазон российских кодов
     
+    @profiled('bot.create_result_file',
+              lambda result, self, results, original_filename: result_shape(results['total']))
     def create_result_file(self, results: dict, original_filename: str) -> str:
         """Создает Excel файл с результатами (один столбец с номерами)"""
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')